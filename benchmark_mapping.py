@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Scalability benchmark for barycentric Gaussian-to-mesh mapping.
+
+Generates deterministic synthetic inputs, runs each pipeline stage on them
+and writes timings, peak memory and accuracy to JSON so that results can be
+compared between versions.
+
+Meshes:
+- sphere: subdivided icosphere (20 * 4^level faces)
+- scan: noisy, hole-punched, randomly ordered UV sphere resembling a
+  reconstructed scan
+
+Splat clouds are sampled uniformly over the mesh surface and pushed off it
+along the face normal by Gaussian noise with standard deviation
+--offset * mesh radius.
+
+Every case runs in a fresh process so that peak RSS reflects that case
+alone. Accuracy is checked against a brute-force nearest-triangle oracle on
+a subsample of the Gaussians.
+
+Usage:
+    python benchmark_mapping.py                       # quick matrix
+    python benchmark_mapping.py --preset full -o results.json
+    python benchmark_mapping.py --faces 100000 --points 1000000 --search bvh
+    python benchmark_mapping.py --faces 100000 --points 100000 --search kdtree brute
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import struct
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+import barycentric_mapping as bm
+
+PRESETS = {
+    'quick': {'faces': [10_000, 100_000], 'points': [100_000, 1_000_000]},
+    'full': {'faces': [10_000, 100_000, 500_000, 2_000_000],
+             'points': [100_000, 1_000_000, 10_000_000]},
+}
+
+# Extra float properties per splat, as in a compact 3DGS export
+# (opacity, scale[3], rotation[4], f_dc[3], normals[3])
+PLY_EXTRA_PROPERTIES = 14
+
+# Upper bound on point-triangle pairs evaluated by the brute-force oracle per case
+ORACLE_MAX_PAIRS = 50_000_000
+
+
+# --- Synthetic inputs ---
+
+def icosphere(level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit icosphere with 20 * 4^level faces."""
+    t = (1 + 5 ** 0.5) / 2
+    vertices = np.array([
+        [-1, t, 0], [1, t, 0], [-1, -t, 0], [1, -t, 0],
+        [0, -1, t], [0, 1, t], [0, -1, -t], [0, 1, -t],
+        [t, 0, -1], [t, 0, 1], [-t, 0, -1], [-t, 0, 1],
+    ], dtype=np.float64)
+    faces = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.int64)
+    
+    for _ in range(level):
+        # One new vertex per unique edge, shared by both adjacent faces
+        edges = np.sort(faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        unique_edges, edge_ids = np.unique(edges, axis=0, return_inverse=True)
+        midpoints = len(vertices) + edge_ids.reshape(-1, 3)
+        vertices = np.vstack([vertices, vertices[unique_edges].mean(axis=1)])
+        a, b, c = faces.T
+        ab, bc, ca = midpoints.T
+        faces = np.concatenate([
+            np.stack([a, ab, ca], 1), np.stack([ab, b, bc], 1),
+            np.stack([ca, bc, c], 1), np.stack([ab, bc, ca], 1),
+        ])
+    
+    vertices /= np.linalg.norm(vertices, axis=1, keepdims=True)
+    return vertices.astype(np.float32), faces.astype(np.int32)
+
+
+def scan_mesh(target_faces: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scan-like mesh of about target_faces triangles: a UV sphere with
+    low-frequency bumps and per-vertex noise, about 1% of faces removed,
+    and vertices and faces in random order.
+    """
+    rng = np.random.default_rng(seed)
+    n_lat = max(int(round((target_faces / 4) ** 0.5)), 3)
+    n_lon = 2 * n_lat
+    theta, phi = np.meshgrid(np.linspace(0.02, np.pi - 0.02, n_lat),
+                             np.linspace(0, 2 * np.pi, n_lon, endpoint=False), indexing='ij')
+    radius = (1 + 0.08 * np.sin(3 * theta) * np.cos(5 * phi)
+              + 0.002 * rng.standard_normal(theta.shape))
+    vertices = np.stack([radius * np.sin(theta) * np.cos(phi),
+                         radius * np.sin(theta) * np.sin(phi),
+                         radius * np.cos(theta)], axis=-1).reshape(-1, 3)
+    
+    grid = np.arange(n_lat * n_lon).reshape(n_lat, n_lon)
+    a = grid[:-1]
+    b = np.roll(grid, -1, axis=1)[:-1]
+    c, d = grid[1:], np.roll(grid, -1, axis=1)[1:]
+    faces = np.concatenate([np.stack([a, b, c], -1).reshape(-1, 3),
+                            np.stack([b, d, c], -1).reshape(-1, 3)])
+    faces = faces[rng.random(len(faces)) >= 0.01]
+    
+    vertex_order = rng.permutation(len(vertices))
+    vertices = vertices[vertex_order]
+    faces = np.argsort(vertex_order)[faces][rng.permutation(len(faces))]
+    return vertices.astype(np.float32), faces.astype(np.int32)
+
+
+def make_mesh(kind: str, target_faces: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Deterministic synthetic mesh of the given kind near target_faces triangles."""
+    if kind == 'sphere':
+        level = max(int(round(np.log(max(target_faces, 20) / 20) / np.log(4))), 0)
+        return icosphere(level)
+    if kind == 'scan':
+        return scan_mesh(target_faces, seed)
+    raise ValueError(f"Unknown mesh kind: {kind}")
+
+
+def sample_splats(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    n_points: int,
+    offset: float = 0.01,
+    seed: int = 1
+) -> np.ndarray:
+    """
+    Sample n_points uniformly over the mesh surface, displaced along the
+    face normal by N(0, offset * mesh radius).
+    """
+    rng = np.random.default_rng(seed)
+    v0, v1, v2 = (vertices[faces[:, i]].astype(np.float64) for i in range(3))
+    cross = np.cross(v1 - v0, v2 - v0)
+    area = np.linalg.norm(cross, axis=1)
+    normals = cross / np.maximum(area, 1e-12)[:, np.newaxis]
+    radius = np.linalg.norm(vertices - vertices.mean(axis=0), axis=1).max()
+    
+    points = np.empty((n_points, 3), dtype=np.float32)
+    cdf = np.cumsum(area)
+    for start in range(0, n_points, 1_000_000):
+        n = min(1_000_000, n_points - start)
+        face = np.minimum(np.searchsorted(cdf, rng.random(n) * cdf[-1]), len(faces) - 1)
+        r1, r2 = np.sqrt(rng.random(n)), rng.random(n)
+        u, v = 1 - r1, r1 * (1 - r2)
+        p = (u[:, np.newaxis] * v0[face] + v[:, np.newaxis] * v1[face]
+             + (1 - u - v)[:, np.newaxis] * v2[face])
+        p += normals[face] * (offset * radius * rng.standard_normal(n))[:, np.newaxis]
+        points[start:start + n] = p
+    return points
+
+
+def write_ply(path: str, points: np.ndarray, extra_properties: int = PLY_EXTRA_PROPERTIES):
+    """Binary little-endian PLY with x, y, z and extra float properties."""
+    names = ['x', 'y', 'z'] + [f'f_{i}' for i in range(extra_properties)]
+    header = (f"ply\nformat binary_little_endian 1.0\nelement vertex {len(points)}\n"
+              + ''.join(f"property float {name}\n" for name in names) + "end_header\n")
+    records = np.zeros(len(points), dtype=[(name, '<f4') for name in names])
+    records['x'], records['y'], records['z'] = points.T
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        records.tofile(f)
+
+
+def write_glb(path: str, vertices: np.ndarray, faces: np.ndarray):
+    """Minimal GLB with one indexed triangle primitive."""
+    position_bytes = np.ascontiguousarray(vertices, dtype='<f4').tobytes()
+    index_bytes = np.ascontiguousarray(faces, dtype='<u4').tobytes()
+    gltf = {
+        'asset': {'version': '2.0'},
+        'buffers': [{'byteLength': len(position_bytes) + len(index_bytes)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(position_bytes)},
+            {'buffer': 0, 'byteOffset': len(position_bytes), 'byteLength': len(index_bytes)},
+        ],
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5126, 'count': len(vertices), 'type': 'VEC3',
+             'min': vertices.min(axis=0).tolist(), 'max': vertices.max(axis=0).tolist()},
+            {'bufferView': 1, 'componentType': 5125, 'count': faces.size, 'type': 'SCALAR'},
+        ],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1}]}],
+        'nodes': [{'mesh': 0}],
+        'scenes': [{'nodes': [0]}],
+        'scene': 0,
+    }
+    json_bytes = json.dumps(gltf).encode()
+    json_bytes += b' ' * (-len(json_bytes) % 4)
+    bin_bytes = position_bytes + index_bytes
+    bin_bytes += b'\0' * (-len(bin_bytes) % 4)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<III', bm.GLB_MAGIC, 2, 28 + len(json_bytes) + len(bin_bytes)))
+        f.write(struct.pack('<II', len(json_bytes), bm.GLB_CHUNK_JSON))
+        f.write(json_bytes)
+        f.write(struct.pack('<II', len(bin_bytes), bm.GLB_CHUNK_BIN))
+        f.write(bin_bytes)
+
+
+# --- Measurement ---
+
+def _time_stage(stages: dict, name: str, items: int, fn, *args, **kwargs):
+    """Run fn, recording wall time, throughput and peak RSS under stages[name]."""
+    resettable = bm.reset_peak_rss()
+    t0 = time.perf_counter()
+    value = fn(*args, **kwargs)
+    seconds = time.perf_counter() - t0
+    stages[name] = {
+        'seconds': seconds,
+        'items_per_second': items / seconds if seconds > 0 else None,
+        'peak_rss_mb': bm.peak_rss_mb(),
+        'peak_rss_is_per_stage': resettable,
+    }
+    return value
+
+
+def brute_force_distances(points: np.ndarray, vertices: np.ndarray, faces: np.ndarray,
+                          max_pairs: int = 1 << 20) -> np.ndarray:
+    """Exact distance from each point to the nearest triangle, by testing every face."""
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    face_tile = max(1, min(len(faces), max_pairs))
+    point_tile = max(1, max_pairs // face_tile)
+    best = np.full(len(points), np.inf, dtype=np.float32)
+    for p in range(0, len(points), point_tile):
+        block = points[p:p + point_tile, np.newaxis]
+        for f in range(0, len(faces), face_tile):
+            _, _, dist = bm.point_to_triangle_distance_and_projection(
+                block, v0[np.newaxis, f:f + face_tile], v1[np.newaxis, f:f + face_tile],
+                v2[np.newaxis, f:f + face_tile]
+            )
+            np.minimum(best[p:p + point_tile], dist.min(axis=1), out=best[p:p + point_tile])
+    return best
+
+
+def run_case(case: dict) -> dict:
+    """Generate one case's inputs and time every stage on them."""
+    out = {'case': case, 'stages': {}}
+    stages = out['stages']
+    
+    with tempfile.TemporaryDirectory(dir=case.get('work_dir')) as work_dir:
+        ply_path = os.path.join(work_dir, 'splats.ply')
+        glb_path = os.path.join(work_dir, 'mesh.glb')
+        
+        t0 = time.perf_counter()
+        vertices, faces = make_mesh(case['mesh'], case['faces'], case['seed'])
+        points = sample_splats(vertices, faces, case['points'], case['offset'], case['seed'] + 1)
+        write_glb(glb_path, vertices, faces)
+        write_ply(ply_path, points)
+        out['generate_seconds'] = time.perf_counter() - t0
+        out['mesh_vertices'], out['mesh_faces'] = len(vertices), len(faces)
+        del vertices, faces, points
+        
+        n_points = case['points']
+        bm.VERBOSE = False
+        points = _time_stage(stages, 'load_ply', n_points, bm.load_ply, ply_path)
+        vertices, faces = _time_stage(stages, 'load_glb', out['mesh_faces'], bm.load_glb, glb_path)
+        if case['search'] == 'brute':
+            mesh = _time_stage(stages, 'prepare_mesh_index', len(faces),
+                               bm.prepare_brute_force_mesh, vertices, faces)
+            result = _time_stage(stages, 'compute_mapping', n_points,
+                                 bm.compute_mapping_brute_force, points, vertices, faces, mesh=mesh)
+        else:
+            mesh_index = _time_stage(stages, 'prepare_mesh_index', len(faces),
+                                     bm.prepare_mesh_index, vertices, faces, case['search'])
+            result = _time_stage(stages, 'compute_mapping', n_points, bm.compute_mapping_cpu,
+                                 points, vertices, faces, case['k_nearest'], case['search'],
+                                 case['workers'], mesh_index)
+        for format in case['formats']:
+            path = os.path.join(work_dir, f'mapping.{format}')
+            _time_stage(stages, f'save_mapping_{format}', n_points, bm.save_mapping,
+                        result, path, format, len(faces))
+            out[f'mapping_{format}_bytes'] = os.path.getsize(path)
+        reconstructed = _time_stage(stages, 'reconstruct_positions', n_points,
+                                    bm.reconstruct_positions, vertices, faces, result)
+    
+    # Accuracy: mapped distance against the exact nearest-triangle distance
+    rng = np.random.default_rng(case['seed'] + 2)
+    # Cap the oracle at ORACLE_MAX_PAIRS point-triangle tests so large meshes stay tractable
+    n_samples = min(case['oracle_samples'], n_points, max(ORACLE_MAX_PAIRS // len(faces), 50))
+    sample = np.sort(rng.choice(n_points, n_samples, replace=False))
+    t0 = time.perf_counter()
+    oracle = brute_force_distances(points[sample], vertices, faces)
+    excess = result.distances[sample] - oracle
+    scale = float(np.linalg.norm(vertices.max(axis=0) - vertices.min(axis=0)))
+    reconstruction_error = np.linalg.norm(reconstructed - points, axis=1)
+    out['accuracy'] = {
+        'oracle_samples': len(sample),
+        'oracle_seconds': time.perf_counter() - t0,
+        'exact_fraction': float(np.mean(excess <= 1e-6 * scale)),
+        'max_distance_excess': float(excess.max()),
+        'mean_distance_excess': float(excess.mean()),
+        'max_reconstruction_error': float(reconstruction_error.max()),
+        'mean_reconstruction_error': float(reconstruction_error.mean()),
+    }
+    out['profile'] = bm.PROFILER.report()
+    out['total_seconds'] = sum(stage['seconds'] for stage in stages.values())
+    out['peak_rss_mb'] = bm.peak_rss_mb()
+    return out
+
+
+def environment_info() -> dict:
+    """Versions and machine details recorded with every result file."""
+    import scipy
+    info = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        info['git_commit'] = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['git_commit'] = None
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark barycentric mapping stages on synthetic meshes and splat clouds'
+    )
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick',
+                        help='Face and point counts to sweep (default: quick)')
+    parser.add_argument('--faces', type=int, nargs='+', default=None,
+                        help='Target mesh face counts (overrides the preset)')
+    parser.add_argument('--points', type=int, nargs='+', default=None,
+                        help='Splat counts (overrides the preset)')
+    parser.add_argument('--mesh', choices=['sphere', 'scan'], nargs='+', default=['sphere', 'scan'],
+                        help='Synthetic mesh kinds (default: sphere scan)')
+    parser.add_argument('--offset', type=float, default=0.01,
+                        help='Splat offset std dev as a fraction of mesh radius (default: 0.01)')
+    parser.add_argument('--search', choices=['kdtree', 'bvh', 'brute'], nargs='+',
+                        default=['kdtree'],
+                        help='CPU search modes to benchmark; brute is the tiled brute-force engine '
+                             'on NumPy (default: kdtree)')
+    parser.add_argument('-k', '--k-nearest', type=int, default=8,
+                        help='Nearest centroids checked by the kdtree search (default: 8)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Mapping worker processes (default: 1)')
+    parser.add_argument('--formats', choices=['npz', 'bin', 'json'], nargs='+',
+                        default=['bin', 'npz'],
+                        help='Output formats to time (default: bin npz)')
+    parser.add_argument('--oracle-samples', type=int, default=1000,
+                        help='Gaussians checked against the brute-force oracle (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the synthetic inputs (default: 0)')
+    parser.add_argument('--work-dir', default=None,
+                        help='Directory for temporary inputs and outputs (default: system temp)')
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help='Results JSON (default: benchmark_results.json)')
+    args = parser.parse_args()
+    
+    face_counts = args.faces or PRESETS[args.preset]['faces']
+    point_counts = args.points or PRESETS[args.preset]['points']
+    cases = [
+        {'mesh': mesh, 'faces': faces, 'points': points, 'search': search,
+         'offset': args.offset, 'k_nearest': args.k_nearest, 'workers': args.workers,
+         'formats': args.formats, 'oracle_samples': args.oracle_samples,
+         'seed': args.seed, 'work_dir': args.work_dir}
+        for mesh in args.mesh for faces in face_counts for points in point_counts
+        for search in args.search
+    ]
+    
+    report = {'environment': environment_info(), 'results': []}
+    print(f"Running {len(cases)} benchmark cases...")
+    for i, case in enumerate(cases):
+        label = f"{case['mesh']} {case['faces']} faces, {case['points']} points, {case['search']}"
+        print(f"[{i + 1}/{len(cases)}] {label}")
+        # A fresh process per case keeps peak RSS from leaking between cases
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context('spawn')
+        ) as pool:
+            result = pool.submit(run_case, case).result()
+        report['results'].append(result)
+        
+        stages = ', '.join(f"{name} {stage['seconds']:.2f}s"
+                           for name, stage in result['stages'].items())
+        accuracy = result['accuracy']
+        print(f"    {stages}")
+        print(f"    peak RSS {result['peak_rss_mb']:.0f} MB, "
+              f"exact {accuracy['exact_fraction'] * 100:.1f}%, "
+              f"max distance excess {accuracy['max_distance_excess']:.2e}")
+        
+        # Rewrite after every case so partial sweeps are not lost
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    print(f"\nSaved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
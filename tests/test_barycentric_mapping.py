@@ -0,0 +1,243 @@
+"""Regression tests for barycentric_mapping on small synthetic meshes."""
+
+import json
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import barycentric_mapping as bm
+
+
+@pytest.fixture(scope='module')
+def mesh():
+    """A bumpy 16x16 height-field grid: 289 vertices, 512 faces."""
+    n = 16
+    x, y = np.meshgrid(np.linspace(-1, 1, n + 1), np.linspace(-1, 1, n + 1))
+    z = 0.2 * np.sin(3 * x) * np.cos(2 * y)
+    vertices = np.stack([x, y, z], axis=-1).reshape(-1, 3).astype(np.float32)
+    
+    idx = np.arange((n + 1) * (n + 1)).reshape(n + 1, n + 1)
+    a, b = idx[:-1, :-1].ravel(), idx[:-1, 1:].ravel()
+    c, d = idx[1:, :-1].ravel(), idx[1:, 1:].ravel()
+    faces = np.concatenate([np.stack([a, b, d], 1), np.stack([a, d, c], 1)]).astype(np.int32)
+    return vertices, faces
+
+
+@pytest.fixture(scope='module')
+def positions():
+    rng = np.random.default_rng(7)
+    points = rng.uniform(-1.2, 1.2, size=(2000, 3)).astype(np.float32)
+    points[:, 2] *= 0.3
+    return points
+
+
+def baseline_mapping(positions, vertices, faces, k_nearest):
+    """The original per-point, per-candidate refinement loop."""
+    from scipy.spatial import KDTree
+    centroids, normals, face_verts = bm.compute_face_data(vertices, faces)
+    _, candidate_faces = KDTree(centroids).query(positions, k=k_nearest)
+    
+    result = bm._empty_mapping(len(positions))
+    for i, point in enumerate(positions):
+        best_dist, best_face, best_bary = np.inf, 0, np.array([1 / 3, 1 / 3, 1 / 3])
+        for face_idx in candidate_faces[i]:
+            v0, v1, v2 = face_verts[face_idx]
+            _, bary, dist = bm.point_to_triangle_distance_and_projection(
+                point[np.newaxis, :], v0[np.newaxis, :], v1[np.newaxis, :], v2[np.newaxis, :])
+            if dist[0] < best_dist:
+                best_dist, best_face, best_bary = dist[0], face_idx, bary[0]
+        result.face_indices[i] = best_face
+        result.bary_coords[i] = best_bary
+        result.distances[i] = best_dist
+        result.normal_offsets[i] = np.dot(point - face_verts[best_face, 0], normals[best_face])
+    return result
+
+
+def test_vectorized_refine_matches_baseline_loop(mesh, positions):
+    vertices, faces = mesh
+    expected = baseline_mapping(positions, vertices, faces, k_nearest=8)
+    result = bm.compute_mapping_cpu(positions, vertices, faces, k_nearest=8)
+    
+    np.testing.assert_array_equal(result.face_indices, expected.face_indices)
+    np.testing.assert_allclose(result.bary_coords, expected.bary_coords, atol=1e-6)
+    np.testing.assert_allclose(result.normal_offsets, expected.normal_offsets, atol=1e-6)
+    np.testing.assert_allclose(result.distances, expected.distances, atol=1e-6)
+
+
+def test_bvh_matches_brute_force_distances(mesh, positions):
+    vertices, faces = mesh
+    brute = bm.compute_mapping_brute_force(positions, vertices, faces)
+    bvh = bm.compute_mapping_cpu(positions, vertices, faces, search='bvh')
+    
+    # Ties between faces may resolve differently; the distance may not
+    np.testing.assert_allclose(bvh.distances, brute.distances, atol=1e-5)
+    _, _, face_verts = bm.compute_face_data(vertices, faces)
+    _, _, dist = bm.point_to_triangle_distance_and_projection(
+        positions, *np.moveaxis(face_verts[bvh.face_indices], 1, 0))
+    np.testing.assert_allclose(dist, bvh.distances, atol=1e-5)
+
+
+def test_bin_round_trip(mesh, positions, tmp_path):
+    vertices, faces = mesh
+    result = bm.compute_mapping_cpu(positions, vertices, faces)
+    path = str(tmp_path / 'mapping.bin')
+    bm.save_mapping(result, path, format='bin', face_count=len(faces))
+    
+    header = bm.read_mapping_header(path)
+    assert header[:3] == (bm.MAPPING_VERSION, len(positions), len(faces))
+    loaded = bm.load_mapping(path)
+    np.testing.assert_array_equal(loaded.face_indices, result.face_indices)
+    np.testing.assert_array_equal(loaded.bary_coords, result.bary_coords)
+    np.testing.assert_array_equal(loaded.normal_offsets, result.normal_offsets)
+    assert np.isnan(loaded.distances).all()
+
+
+@pytest.mark.parametrize('offset_encoding', ['int16', 'float16'])
+def test_qbin_round_trip(mesh, positions, tmp_path, offset_encoding):
+    vertices, faces = mesh
+    result = bm.compute_mapping_cpu(positions, vertices, faces)
+    path = str(tmp_path / 'mapping.qbin')
+    bm.save_mapping(result, path, format='qbin', face_count=len(faces),
+                    offset_encoding=offset_encoding)
+    
+    loaded = bm.load_mapping(path)
+    np.testing.assert_array_equal(loaded.face_indices, result.face_indices)
+    np.testing.assert_allclose(loaded.bary_coords, result.bary_coords, atol=1 / 65535)
+    peak = np.abs(result.normal_offsets).max()
+    step = peak / 32767 if offset_encoding == 'int16' else peak * 2.0 ** -11
+    np.testing.assert_allclose(loaded.normal_offsets, result.normal_offsets, atol=step)
+    
+    error = bm.quantization_error(vertices, faces, result,
+                                  bm.quantize_mapping(result, len(faces), offset_encoding))
+    assert error < 1e-3
+
+
+def test_qbin_face_index_width():
+    result = bm._empty_mapping(2)
+    result.face_indices[:] = [0, 65535]
+    assert bm.quantize_mapping(result, 65536).face_index_bytes == 2
+    assert bm.quantize_mapping(result, 65537).face_index_bytes == 3
+    with pytest.raises(ValueError):
+        bm.quantize_mapping(result, (1 << 32) + 1)
+
+
+def write_binary_ply(path, positions):
+    """A binary PLY with x, y, z and an extra property per vertex."""
+    header = (f"ply\nformat binary_little_endian 1.0\nelement vertex {len(positions)}\n"
+              f"property float x\nproperty float y\nproperty float z\n"
+              f"property float opacity\nend_header\n")
+    data = np.zeros(len(positions), dtype=[('xyz', '<f4', 3), ('opacity', '<f4')])
+    data['xyz'] = positions
+    with open(path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(data.tobytes())
+
+
+def test_streaming_matches_in_memory(mesh, positions, tmp_path):
+    vertices, faces = mesh
+    ply_path = str(tmp_path / 'gaussians.ply')
+    write_binary_ply(ply_path, positions)
+    np.testing.assert_array_equal(bm.load_ply(ply_path), positions)
+    
+    in_memory = str(tmp_path / 'in_memory.bin')
+    bm.save_mapping(bm.compute_mapping_cpu(positions, vertices, faces), in_memory,
+                    format='bin', face_count=len(faces))
+    streamed = str(tmp_path / 'streamed.bin')
+    count = bm.map_ply_streaming(ply_path, streamed,
+                                 lambda chunk: bm.compute_mapping_cpu(chunk, vertices, faces),
+                                 format='bin', chunk_size=700, face_count=len(faces))
+    
+    assert count == len(positions)
+    assert Path(streamed).read_bytes() == Path(in_memory).read_bytes()
+
+
+def quaternion_matrix(x, y, z, w):
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+def build_glb(gltf, binary):
+    """Pack a glTF document and its binary buffer into a GLB container."""
+    json_chunk = json.dumps(gltf).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    binary += b'\0' * (-len(binary) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return (struct.pack('<III', bm.GLB_MAGIC, 2, length) +
+            struct.pack('<II', len(json_chunk), bm.GLB_CHUNK_JSON) + json_chunk +
+            struct.pack('<II', len(binary), bm.GLB_CHUNK_BIN) + binary)
+
+
+@pytest.fixture(scope='module')
+def quantized_glb():
+    """
+    A quad with normalized int16 positions interleaved with int8 normals
+    (12-byte stride, KHR_mesh_quantization), instanced by a TRS node and
+    its translated child.
+    """
+    quantized = np.array([[0, 0, 0], [32767, 0, 0], [32767, 16384, 0], [0, 16384, -32767]],
+                         dtype='<i2')
+    vertex_data = np.zeros(4, dtype=[('position', '<i2', 3), ('pad', 'u1', 2),
+                                     ('normal', 'i1', 3), ('pad2', 'u1')])
+    vertex_data['position'] = quantized
+    vertex_data['normal'] = [0, 0, 127]
+    indices = np.array([0, 1, 2, 0, 2, 3], dtype='<u2')
+    binary = vertex_data.tobytes() + indices.tobytes()
+    
+    half = np.sqrt(0.5)
+    gltf = {
+        'asset': {'version': '2.0'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [
+            {'mesh': 0, 'translation': [1.0, 2.0, 3.0], 'rotation': [0.0, 0.0, half, half],
+             'scale': [2.0, 2.0, 2.0], 'children': [1]},
+            {'mesh': 0, 'translation': [0.0, 0.0, 5.0]},
+        ],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0, 'NORMAL': 1}, 'indices': 2}]}],
+        'buffers': [{'byteLength': len(binary)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': vertex_data.nbytes, 'byteStride': 12},
+            {'buffer': 0, 'byteOffset': vertex_data.nbytes, 'byteLength': indices.nbytes},
+        ],
+        'accessors': [
+            {'bufferView': 0, 'byteOffset': 0, 'componentType': 5122, 'normalized': True,
+             'count': 4, 'type': 'VEC3', 'min': [0, 0, -1], 'max': [1, 0.5, 0]},
+            {'bufferView': 0, 'byteOffset': 8, 'componentType': 5120, 'normalized': True,
+             'count': 4, 'type': 'VEC3'},
+            {'bufferView': 1, 'componentType': 5123, 'count': 6, 'type': 'SCALAR'},
+        ],
+    }
+    
+    local = quantized / np.float32(32767)
+    root = np.eye(4)
+    root[:3, :3] = quaternion_matrix(0.0, 0.0, half, half) * 2.0
+    root[:3, 3] = [1.0, 2.0, 3.0]
+    child = np.eye(4)
+    child[:3, 3] = [0.0, 0.0, 5.0]
+    expected = [(local @ world[:3, :3].T + world[:3, 3]) for world in (root, root @ child)]
+    return build_glb(gltf, binary), np.concatenate(expected), indices.reshape(-1, 3)
+
+
+def test_glb_stride_trs_and_quantization(quantized_glb, tmp_path):
+    data, expected_vertices, tris = quantized_glb
+    path = tmp_path / 'quad.glb'
+    path.write_bytes(data)
+    
+    for source in (str(path), data):
+        vertices, faces = bm.load_glb(source)
+        np.testing.assert_allclose(vertices, expected_vertices, atol=1e-5)
+        np.testing.assert_array_equal(faces, np.concatenate([tris, tris + 4]))
+    
+    gltf, buffers = bm.read_glb(data)
+    normals = bm.read_accessor(gltf, buffers, 1)
+    np.testing.assert_allclose(normals, [[0, 0, 1]] * 4)